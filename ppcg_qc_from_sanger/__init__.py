@@ -1,4 +1,5 @@
 import subprocess
+from functools import lru_cache
 from typing import Tuple
 import os
 import sys
@@ -15,6 +16,10 @@ def format_float(a_float):
     return str(format(a_float, '.3f'))
 
 
+# the same paths are checked repeatedly across the input scans and the
+# per-pair extractors; inputs do not change mid-run, so cache the positive
+# results (a raise is never cached, missing paths are always re-checked)
+@lru_cache(maxsize=None)
 def check_file_exists(file_path):
     if not os.path.exists(file_path):
         raise RuntimeError('file %s does not exist.' % file_path)
@@ -11,6 +11,18 @@ from ppcg_qc_from_sanger.extract_qc import extract_from_sanger
 version = pkg_resources.require("ppcg-qc-from-sanger")[0].version
 
 
+def existing_path(path):
+    """
+    argparse type callable: resolve a path argument and check it exists at
+    parse time, so bad inputs fail fast and later stages receive ready
+    absolute paths instead of re-resolving each one.
+    """
+    real_path = os.path.realpath(path)
+    if not os.path.exists(real_path):
+        raise argparse.ArgumentTypeError('could not find the file/directory: %s' % path)
+    return real_path
+
+
 def main():
     """
     Sets up the parser and handles triggereing of correct sub-command
@@ -24,6 +36,7 @@ def main():
         '-tb', '--tumour_bas',
         dest='tumour_bas',
         metavar='FILE|DIRECTORY',
+        type=existing_path,
         action='append',
         help='Tumour sample BAS files (.bam.bas) or directories containing the files. Multiple entries should be separated by a space.',
         required=True)
@@ -31,6 +44,7 @@ def main():
         '-nb', '--normal_bas',
         dest='normal_bas',
         metavar='FILE|DIRECTORY',
+        type=existing_path,
         action='append',
         help='Normal sample BAS files (.bam.bas) or directories containing the files. Multiple entries should be separated by a space.',
         required=True)
@@ -38,6 +52,7 @@ def main():
         '-rt', '--variant_call_tar',
         dest='variant_call_tar',
         metavar='FILE|DIRECTORY',
+        type=existing_path,
         action='append',
         help='The compressed tar result files from cgpwgs variant calling pipeline of the two samples, or directories containing the files. Multiple entries should be separated by a space.',
         required=True)
@@ -46,7 +61,7 @@ def main():
         dest='output_tar',
         metavar='STRING',
         type=str,
-        help='the file name of the compressed tar result, requires ".tar.gz" extension.',
+        help='the file name of the compressed tar result, requires ".tar.gz" extension. A ".tar.zst" extension is also accepted when the zstandard module is installed.',
         required=True)
     parser.add_argument(
         '-gs', '--genome_size',
@@ -58,6 +73,7 @@ def main():
         '-mt', '--metadata',
         dest='metadata',
         metavar='FILE|DIRECTORY',
+        type=existing_path,
         help='CgpNgsQC validate_sample_meta.pl output tsv file(s), or directories containing the files. A metadata file can have extra optional columns: "Sequencing_Year" and "Sequencer". Multiple entries should be separated by a space.',
         action='append')
     parser.add_argument(
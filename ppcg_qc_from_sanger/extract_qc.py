@@ -1,14 +1,30 @@
 import os
 import sys
+import shutil
+import subprocess
 import tarfile
 import logging
 import re
 import json
+import io
+import gzip
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from tempfile import TemporaryDirectory
 from .sanger_qc_extractor import SangerQcMetricsExtractor, set_extractor_logger_level
 from . import check_file_exists_for_user
 from typing import List, Dict, Tuple, Any
 
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # TODO Change inputs to lists, complain if tumour samples have duplicated names, complain if missing bas files, warning if there're more tumour or normal bas files!
 # TODO use tumour sample names as folder names in output, put genotype files in it
 # TODO all metrics to one file
@@ -120,6 +136,24 @@ VARIANT_COUNT_HEADER = [
     'Number of CNVs'
 ]
 
+# header lines joined once at import; the old in-loop 'header +=' also
+# mutated OUTPUT_HEADER itself on every run with variant counting on
+OUTPUT_HEADER_LINE = '\t'.join(OUTPUT_HEADER) + '\n'
+OUTPUT_HEADER_LINE_WITH_VARIANT_COUNTS = '\t'.join(OUTPUT_HEADER + VARIANT_COUNT_HEADER) + '\n'
+
+# copy added files in 1 MiB chunks instead of tarfile's default 16 KiB
+TAR_COPY_BUFSIZE = 1024 * 1024
+
+# sidecar member-name index some pipelines keep next to their archives
+TAR_INDEX_SUFFIX = '.idx.json.gz'
+
+# compiled once at import, these are matched against every directory entry
+# and tar member on the file enumeration paths
+BAS_FILE_REGEX = re.compile(r'.+\.bam\.bas$')
+TAR_GZ_FILE_REGEX = re.compile(r'.+\.tar\.gz$')
+TSV_FILE_REGEX = re.compile(r'.+\.tsv$')
+WGS_PAIR_REGEX = re.compile(r'^WGS_([\w\-]+)_vs_([\w\-]+)$')
+
 PPCG_META_TO_EXTRACTOR_MAP = {
     'donor_id': 'donor_id',
     'donor_uuid': 'donor_uuid',
@@ -164,61 +198,177 @@ def extract_from_sanger(args):
         t_n_pair_meta = get_t_n_pair_meta(sample_id_meta, sample_uuid_meta, t_n_pair_tar.keys())
 
     count_variants = args.count_variants
-    # print('count_variants', count_variants)
 
     # create a temp dir to store extracted files
     with TemporaryDirectory() as temp_dir:
         output_metrics_file = os.path.join(temp_dir, 'ppcg_sanger_metrics.txt')
-        genotyping_files = []
+        genotyping_blobs = []
+
+        # each pair is processed in its own sub directory so extractions
+        # can run concurrently without clashing
+        payloads = []
+        for index, (t_n_pair, v_tar) in enumerate(t_n_pair_tar.items()):
+            logger.info('processing sanger call tar: %s', v_tar)
+            logger.debug('processing sanger call tar: %s, tumour: %s, normal: %s, genome_size: %s, count_v: %s, meta_data: %s', v_tar, t_name_bas[t_n_pair[0]], n_name_bas[t_n_pair[1]], genome_size, count_variants, json.dumps(t_n_pair_meta.get(t_n_pair, {})))
+            pair_dir = os.path.join(temp_dir, 'pair_%d' % index)
+            os.mkdir(pair_dir)
+            payloads.append((
+                t_name_bas[t_n_pair[0]], n_name_bas[t_n_pair[1]], genome_size, v_tar,
+                pair_dir, count_variants, t_n_pair_meta.get(t_n_pair, None)))
+
+        metrics_rows = [
+            OUTPUT_HEADER_LINE_WITH_VARIANT_COUNTS if count_variants else OUTPUT_HEADER_LINE]
+
+        # pairs are independent and CPU-bound on gzip, so spread them
+        # over processes; map keeps results in input order. no pairs (e.g. a
+        # call tar directory with no tar.gz in it) still writes a header-only
+        # output, and an executor can not be created with 0 workers
+        if payloads:
+            with ProcessPoolExecutor(max_workers=min(len(payloads), os.cpu_count() or 1)) as executor:
+                for metrics, pair_genotyping_blobs in executor.map(process_one_pair, payloads):
+                    metrics_rows.append('\t'.join(metrics) + '\n')
+                    genotyping_blobs.extend(pair_genotyping_blobs)
 
         with open(output_metrics_file, 'w') as o:
-            header = OUTPUT_HEADER
-            if count_variants:
-                header += VARIANT_COUNT_HEADER
-            o.write('\t'.join(header) + '\n')
-
-            for t_n_pair, v_tar in t_n_pair_tar.items():
-                logger.info('processing sanger call tar: %s', v_tar)
-                logger.debug('processing sanger call tar: %s, tumour: %s, normal: %s, genome_size: %s, count_v: %s, meta_data: %s', v_tar, t_name_bas[t_n_pair[0]], n_name_bas[t_n_pair[1]], genome_size, count_variants, json.dumps(t_n_pair_meta.get(t_n_pair, {})))
-                extractor = SangerQcMetricsExtractor(t_name_bas[t_n_pair[0]], n_name_bas[t_n_pair[1]], genome_size, v_tar, temp_dir, count_variants, t_n_pair_meta.get(t_n_pair, None))
-                o.write('\t'.join(extractor.get_metrics()) + '\n')
-                genotyping_files.extend(extractor.get_genotyping_files())
-                extractor.clean_output_dir()
+            o.writelines(metrics_rows)
 
         # tar all files in temp_dir to the ourput_tar
         try:
-            with tarfile.open(output_tar, 'w:gz') as tar:
-                tar.add(output_metrics_file, arcname=os.path.basename(output_metrics_file))
-                for a_file in genotyping_files:
-                    tar.add(a_file, arcname=os.path.basename(a_file))
+            with open_output_tar(output_tar) as tar:
+                with open(output_metrics_file, 'rb') as metrics:
+                    tar.addfile(
+                        fast_tarinfo(output_metrics_file, os.path.basename(output_metrics_file)),
+                        metrics)
+                for name, content in genotyping_blobs:
+                    tar_info = tarfile.TarInfo(name)
+                    tar_info.size = len(content)
+                    tar.addfile(tar_info, io.BytesIO(content))
         except Exception as exc:
             logger.critical('failed to create the final output: %s', str(exc))
             sys.exit(1)
     logger.info('completed')
 
 
+def process_one_pair(payload):
+    '''
+    extract the metrics of a single tumour/normal pair in its own sub
+    directory, returning the metrics row and the extracted genotyping files
+    '''
+    tumour_bas, normal_bas, genome_size, v_tar, pair_dir, count_variants, metadata = payload
+    extractor = SangerQcMetricsExtractor(
+        tumour_bas, normal_bas, genome_size, v_tar, pair_dir, count_variants, metadata)
+    metrics = extractor.get_metrics()
+    pair_genotyping_blobs = extractor.get_genotyping_blobs()
+    extractor.clean_output_dir()
+    return metrics, pair_genotyping_blobs
+
+
 def check_paras(args):
     if not isinstance(args.genome_size, int):
         logger.critical('genome_size is not int')
         sys.exit(1)
 
     output_tar = os.path.abspath(args.output_tar)
-    # if tar file has '.tar.gz' extension
-    SangerQcMetricsExtractor.validate_tar_name(output_tar)
-
-    # test if output is writable
-    if not os.path.exists(output_tar):
-        try:
-            with open(output_tar, 'w') as out:
-                out.write('place holder\n')
-        except OSError as exc:
-            logger.critical('output is not writable: %s.', str(exc))
+    # if tar file has '.tar.gz' extension; '.tar.zst' is also accepted when
+    # the zstandard module is installed
+    if output_tar.endswith('.tar.zst'):
+        if zstandard is None:
+            logger.critical('".tar.zst" output requires the zstandard module to be installed.')
             sys.exit(1)
-        finally:
-            os.remove(output_tar)
     else:
+        SangerQcMetricsExtractor.validate_tar_name(output_tar)
+
+    # test if output is writable, without a create-delete round trip
+    if os.path.exists(output_tar):
         logger.critical('existing output file: %s.', output_tar)
         sys.exit(1)
+    if not os.access(os.path.dirname(output_tar) or '.', os.W_OK):
+        logger.critical('output is not writable: %s.', output_tar)
+        sys.exit(1)
+
+
+def set_tar_copy_bufsize(tar):
+    '''
+    make tar.add copy file contents in TAR_COPY_BUFSIZE chunks instead of the
+    default 16 KiB, cutting read/write calls per added file.
+    a no-op on Pythons older than 3.8, where the attribute is not used.
+    '''
+    tar.copybufsize = TAR_COPY_BUFSIZE
+
+
+@contextmanager
+def open_output_tar(output_tar):
+    '''
+    open output_tar for writing as a compressed tar stream.
+    a ".tar.zst" name selects multi-threaded zstd compression (requires the
+    zstandard module); otherwise the output is gzip, using the fastest
+    compressor available: pigz (parallel gzip) if it is in PATH, then isal
+    igzip (SIMD accelerated) if the module is importable, finally the
+    single-threaded stdlib gzip
+    '''
+    if output_tar.endswith('.tar.zst'):
+        if zstandard is None:
+            raise RuntimeError('".tar.zst" output requires the zstandard module.')
+        logger.debug('compressing the output with zstd')
+        compressor = zstandard.ZstdCompressor(threads=-1, level=3)
+        with open(output_tar, 'wb') as raw:
+            with compressor.stream_writer(raw) as zst:
+                with tarfile.open(fileobj=zst, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                    set_tar_copy_bufsize(tar)
+                    yield tar
+        return
+    pigz = shutil.which('pigz')
+    if pigz:
+        logger.debug('compressing the output with pigz')
+        with open(output_tar, 'wb') as raw:
+            process = subprocess.Popen([pigz, '-c'], stdin=subprocess.PIPE, stdout=raw)
+            try:
+                with tarfile.open(fileobj=process.stdin, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                    set_tar_copy_bufsize(tar)
+                    yield tar
+            finally:
+                process.stdin.close()
+                returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError('pigz exited with code %d' % returncode)
+    elif igzip is not None:
+        logger.debug('compressing the output with isal igzip')
+        with igzip.open(output_tar, 'wb', compresslevel=1) as gz:
+            with tarfile.open(fileobj=gz, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                set_tar_copy_bufsize(tar)
+                yield tar
+    else:
+        logger.debug('compressing the output with stdlib gzip')
+        with tarfile.open(output_tar, 'w:gz') as tar:
+            set_tar_copy_bufsize(tar)
+            yield tar
+
+
+@contextmanager
+def open_tar_stream(a_tar):
+    '''
+    open a gzip compressed tar for sequential reading, inflating with isal
+    igzip (SIMD accelerated) when the module is importable, otherwise with
+    the stdlib gzip built into tarfile
+    '''
+    if igzip is not None:
+        with igzip.open(a_tar, 'rb') as gz:
+            with tarfile.open(fileobj=gz, mode='r|') as tar:
+                yield tar
+    else:
+        with tarfile.open(a_tar, mode='r|gz') as tar:
+            yield tar
+
+
+def fast_tarinfo(a_file, arcname):
+    '''
+    build a TarInfo carrying only the file size, leaving ownership, mode
+    and mtime at TarInfo's canonical defaults; avoids tar.add's full stat
+    metadata copy and keeps the archive entries deterministic
+    '''
+    tar_info = tarfile.TarInfo(arcname)
+    tar_info.size = os.path.getsize(a_file)
+    return tar_info
 
 
 def append_to_file_path_list(a_path, path_list):
@@ -235,10 +385,13 @@ def get_all_bas(input_abs: List[str]):
         check_file_exists_for_user(path, logger)
         if os.path.isdir(path):
             logger.warning('%s is a directory, will take all BAS files in the folder, but not any file in a sub directory.', path)
-            for a_file in os.scandir(path):
-                if os.path.isfile(a_file) and re.match(r'.+\.bam\.bas$', a_file.name):
-                    SangerQcMetricsExtractor.validate_bas(a_file)
-                    to_return = append_to_file_path_list(os.path.abspath(a_file), to_return)
+            # DirEntry.is_file() reuses the type info the directory scan
+            # already fetched, so no extra stat per entry
+            with os.scandir(path) as entries:
+                for a_file in entries:
+                    if a_file.is_file() and BAS_FILE_REGEX.match(a_file.name):
+                        SangerQcMetricsExtractor.validate_bas(a_file.path)
+                        to_return = append_to_file_path_list(os.path.abspath(a_file.path), to_return)
         else:
             SangerQcMetricsExtractor.validate_bas(path)
             to_return = append_to_file_path_list(os.path.abspath(path), to_return)
@@ -251,9 +404,10 @@ def get_all_variant_call_tar(input_call_tars: List[str]):
         check_file_exists_for_user(path, logger)
         if os.path.isdir(path):
             logger.warning('%s is a directory, will take all tar.gz files in the folder, but not any file in a sub directory.', path)
-            for a_file in os.scandir(path):
-                if os.path.isfile(a_file) and re.match(r'.+\.tar\.gz$', a_file.name):
-                    to_return = append_to_file_path_list(os.path.abspath(a_file), to_return)
+            with os.scandir(path) as entries:
+                for a_file in entries:
+                    if a_file.is_file() and TAR_GZ_FILE_REGEX.match(a_file.name):
+                        to_return = append_to_file_path_list(os.path.abspath(a_file.path), to_return)
         else:
             SangerQcMetricsExtractor.validate_tar_name(path)
             to_return = append_to_file_path_list(os.path.abspath(path), to_return)
@@ -262,18 +416,22 @@ def get_all_variant_call_tar(input_call_tars: List[str]):
 
 def get_validated_t_n_pair_and_bas_lists(tumour_bas: List[str], normal_bas: List[str], variant_call_tars: List[str]) -> Tuple[Dict[str, str], Dict[str, str], Dict[Tuple[str, str], str]]:
     t_n_pair_tar: Dict[Tuple[str, str], str] = get_all_t_n_pairs(variant_call_tars)
-    expected_tumours = [a_pair[0] for a_pair in t_n_pair_tar.keys()]
-    expected_normals = [a_pair[1] for a_pair in t_n_pair_tar.keys()]
+    # collect both sample name sets in one pass over the pairs
+    expected_tumours: set = set()
+    expected_normals: set = set()
+    for t_name, n_name in t_n_pair_tar:
+        expected_tumours.add(t_name)
+        expected_normals.add(n_name)
     t_name_bas: Dict[str, str] = get_sample_names_bas_file_dict(tumour_bas)
     n_name_bas: Dict[str, str] = get_sample_names_bas_file_dict(normal_bas)
 
     # if all expected tumour have bas
-    not_found = sorted(set(expected_tumours) - set(t_name_bas.keys()))
+    not_found = sorted(expected_tumours - t_name_bas.keys())
     if not_found:
         logger.critical('Missing BAS files for tumour samples: %s', ', '.join(not_found))
         sys.exit(1)
     # if all expected normal have bas
-    not_found = sorted(set(expected_normals) - set(n_name_bas.keys()))
+    not_found = sorted(expected_normals - n_name_bas.keys())
     if not_found:
         logger.critical('Missing BAS files for normal samples: %s', ', '.join(not_found))
         sys.exit(1)
@@ -281,19 +439,54 @@ def get_validated_t_n_pair_and_bas_lists(tumour_bas: List[str], normal_bas: List
     return t_name_bas, n_name_bas, t_n_pair_tar
 
 
+def get_pair_names_from_tar_index(a_tar):
+    '''
+    look for a sidecar member-name index (gzipped JSON list) next to a_tar;
+    when one exists and is at least as new as the tar, matching against it
+    avoids decompressing the archive at all.
+    returns (t_name, n_name), or None when no usable index is found.
+    '''
+    index_file = a_tar + TAR_INDEX_SUFFIX
+    try:
+        if os.path.getmtime(index_file) < os.path.getmtime(a_tar):
+            return None
+        with gzip.open(index_file, 'rt') as idx:
+            member_names = json.load(idx)
+    except (OSError, ValueError):
+        return None
+    # an index holding valid JSON of the wrong shape is just as unusable
+    # as an unparsable one; degrade to the streaming scan for it too
+    if not isinstance(member_names, list):
+        return None
+    for name in member_names:
+        if not isinstance(name, str):
+            continue
+        matches = WGS_PAIR_REGEX.match(name)
+        if matches:
+            return matches.group(1), matches.group(2)
+    return None
+
+
 def get_all_t_n_pairs(variant_call_tars) -> Dict[Tuple[str, str], str]:
     t_n_pair_tar = {}
     for a_tar in variant_call_tars:
         t_name = n_name = None
-        with tarfile.open(a_tar, 'r:gz') as tar:
-            logger.info('validating tar file %s', a_tar)
-            all_files = tar.getmembers()
-            for a_file in all_files:
-                matches = re.match(r'^WGS_([\w\-]+)_vs_([\w\-]+)$', a_file.name)
-                if matches:
-                    t_name = matches.group(1)
-                    n_name = matches.group(2)
-                    break
+        pair_names = get_pair_names_from_tar_index(a_tar)
+        if pair_names:
+            logger.info('validating tar file %s using its sidecar index', a_tar)
+            t_name, n_name = pair_names
+        else:
+            # streaming mode: members are read sequentially, so decompression
+            # stops as soon as the WGS pair directory is found near the archive
+            # head, instead of indexing the whole multi-GB tarball
+            with open_tar_stream(a_tar) as tar:
+                logger.info('validating tar file %s', a_tar)
+                for a_file in tar:
+                    matches = WGS_PAIR_REGEX.match(a_file.name)
+                    if matches:
+                        t_name = matches.group(1)
+                        n_name = matches.group(2)
+                        break
         if not t_name:
             logger.critical(f'Not a valid Sanger Variant Call result archive: {a_tar}')
             sys.exit(1)
@@ -302,10 +495,16 @@ def get_all_t_n_pairs(variant_call_tars) -> Dict[Tuple[str, str], str]:
 
 
 def get_sample_names_bas_file_dict(bas_list):
-    return {
-        SangerQcMetricsExtractor.get_sample_name_from_bas(SangerQcMetricsExtractor.get_bas_content(bas)): bas
-        for bas in bas_list
-    }
+    if not bas_list:
+        return {}
+    # BAS files often live on network storage, read them concurrently so
+    # the open/read round trips overlap instead of paying one RTT each
+    with ThreadPoolExecutor(max_workers=min(len(bas_list), 32)) as executor:
+        contents = executor.map(SangerQcMetricsExtractor.get_bas_content, bas_list)
+        return {
+            SangerQcMetricsExtractor.get_sample_name_from_bas(content): bas
+            for content, bas in zip(contents, bas_list)
+        }
 
 
 def get_all_meta(metadata_paths):
@@ -314,9 +513,10 @@ def get_all_meta(metadata_paths):
         check_file_exists_for_user(path, logger)
         if os.path.isdir(path):
             logger.warning('%s is a directory, will take all tsv files in the folder, but not any file in a sub directory.', path)
-            for a_file in os.scandir(path):
-                if os.path.isfile(a_file) and re.match(r'.+\.tsv$', a_file.name):
-                    to_return = append_to_file_path_list(os.path.abspath(a_file), to_return)
+            with os.scandir(path) as entries:
+                for a_file in entries:
+                    if a_file.is_file() and TSV_FILE_REGEX.match(a_file.name):
+                        to_return = append_to_file_path_list(os.path.abspath(a_file.path), to_return)
         else:
             to_return = append_to_file_path_list(os.path.abspath(path), to_return)
     return to_return
@@ -1,4 +1,5 @@
 import os
+import csv
 import shutil
 import sys
 import errno
@@ -7,6 +8,7 @@ import logging
 import json
 import re
 import gzip
+from functools import lru_cache
 from statistics import median
 from tempfile import TemporaryDirectory
 from . import exec_subp_and_wait, check_file_exists, format_float
@@ -30,6 +32,26 @@ def set_extractor_logger_level(logging_level):
     logger.setLevel(logging_level)
 
 
+def _read_tsv_rows(a_file):
+    '''
+    tokenize a tab-separated file with the C-backed csv reader rather than
+    per-line Python str.split
+    '''
+    with open(a_file, 'r', newline='') as f:
+        return list(csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE))
+
+
+@lru_cache(maxsize=None)
+def _cached_bas_content(bas_file, mtime_ns):
+    '''
+    parse a BAS file once per (path, mtime) pair; the same file is typically
+    requested several times within a run (tumour/normal lists, extractors)
+    '''
+    bas = _read_tsv_rows(bas_file)
+    bas.pop(0)
+    return bas
+
+
 def join_and_median(a_list):
     return ','.join(
         [format_float(a_number) for a_number in a_list]
@@ -247,6 +269,17 @@ class SangerQcMetricsExtractor(object):
     def get_genotyping_files(self):
         return self.extracted_files['genotyping']
 
+    def get_genotyping_blobs(self):
+        '''
+        read the extracted genotyping files into memory as (name, bytes)
+        pairs, so the caller can tar them without re-reading from disk
+        '''
+        blobs = []
+        for a_file in self.extracted_files['genotyping']:
+            with open(a_file, 'rb') as f:
+                blobs.append((os.path.basename(a_file), f.read()))
+        return blobs
+
     def clean_output_dir(self):
         try:
             shutil.rmtree(os.path.join(self.output_dir, f'WGS_{self.t_sample_name}_vs_{self.n_sample_name}'))
@@ -343,11 +376,9 @@ class SangerQcMetricsExtractor(object):
         file_name = os.path.basename(bas_file)
         if re.match(r'.+\.bam\.bas$', file_name) is None:
             raise RuntimeError('invalid BAS filename: %s, expecting ".bam.bas" suffix.' % bas_file)
-        with open(bas_file, 'r') as f:
-            lines = f.readlines()
-        if len(lines) <= 1:
+        bas = _read_tsv_rows(bas_file)
+        if len(bas) <= 1:
             raise RuntimeError('too few lines in %s.' % bas_file)
-        bas = [line.rstrip('\n').split('\t') for line in lines]
         if bas[0] != SangerQcMetricsExtractor.BAS_HEADER:
             raise RuntimeError('invalid BAS header in %s.' % bas_file)
         col_number = len(bas[0])
@@ -362,11 +393,10 @@ class SangerQcMetricsExtractor(object):
 
     @staticmethod
     def get_bas_content(bas_file):
-        with open(bas_file, 'r') as f:
-            lines = f.readlines()
-        bas = [line.rstrip('\n').split('\t') for line in lines]
-        bas.pop(0)
-        return bas
+        bas_file = os.path.abspath(bas_file)
+        # key on mtime as well so an overwritten file is re-parsed;
+        # return a shallow copy so callers can not corrupt the cache
+        return list(_cached_bas_content(bas_file, os.stat(bas_file).st_mtime_ns))
 
     @staticmethod
     def get_rg_ids_from_bas(bas_content):
@@ -61,6 +61,37 @@ class PpcgQcFromSangerExtractQcTestCase(unittest.TestCase):
                 test = testing_function(test_file)
             self.assertIn('invalid row in BAS file', str(exc.value))
 
+    def test_extract_from_sanger_no_pairs(self):
+        '''
+        a call tar directory with no tar.gz files in it yields no pairs; the
+        run should still complete with a header-only metrics file
+        '''
+        testing_function = extract_qc.extract_from_sanger
+        with TemporaryDirectory() as temp_dir:
+            empty_tar_dir = os.path.join(temp_dir, 'no_tars_here')
+            os.mkdir(empty_tar_dir)
+            args = Namespace(
+                tumour_bas=[os.path.join(self.test_dir, 'tumour_sample.bam.bas')],
+                normal_bas=[os.path.join(self.test_dir, 'normal_sample.bam.bas')],
+                variant_call_tar=[empty_tar_dir],
+                output_tar=os.path.join(temp_dir, 'result.tar.gz'),
+                genome_size=3137454505,
+                debug=False,
+                count_variants=False,
+                metadata=[]
+            )
+            self.assertEqual(testing_function(args), None)
+
+            # only the header-only metrics file should be in the tar
+            metrics_file = 'ppcg_sanger_metrics.txt'
+            with tarfile.open(args.output_tar, 'r:gz') as tar:
+                self.assertEqual([a_file.name for a_file in tar.getmembers()], [metrics_file])
+                tar.extract(metrics_file, path=temp_dir)
+            self.assertEqual(
+                open(os.path.join(temp_dir, metrics_file), 'r').read(),
+                extract_qc.OUTPUT_HEADER_LINE
+            )
+
     def test_extract_from_sanger(self):
         '''
         testing the whole process